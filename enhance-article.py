@@ -2,204 +2,328 @@
 """
 Enhance article.json with complex layout and formatting structures
 """
-import json
-import re
+import math
+import mmap
+import os
+import stat
+import tempfile
+from decimal import Decimal
+from functools import lru_cache
+from itertools import chain
+from pathlib import Path
+from types import MappingProxyType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+ARTICLE_PATH = 'article.json'
+METADATA_PATH = Path(__file__).with_name('section-metadata.json')
+
+_MISSING = object()
+
+
+def _loads(data):
+    """Parse JSON from a bytes-like object"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+def _default(obj):
+    """Serialize the Decimals ijson yields for non-integer numbers"""
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        # orjson refuses infinities; _orjson_numbers reports them
+        if orjson is not None and math.isinf(value):
+            raise ValueError(obj)
+        return value
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _orjson_numbers(obj):
+    """
+    Convert the numbers ijson yields the way orjson.loads would have read them.
+
+    Integers outside orjson's 64-bit range become floats, and numbers too
+    large for a double are refused.
+    """
+    if isinstance(obj, dict):
+        return {key: _orjson_numbers(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_orjson_numbers(item) for item in obj]
+    if isinstance(obj, int) and not -2 ** 63 <= obj < 2 ** 64:
+        return float(obj)
+    if isinstance(obj, Decimal):
+        value = float(obj)
+        if math.isinf(value):
+            raise ValueError(f'Number {obj} is infinity when parsed as double')
+        return value
+    return obj
+
+
+def _dumps(obj):
+    """
+    Serialize to UTF-8 JSON bytes.
+
+    orjson indents natively. The stdlib fallback stays compact, since any
+    indent forces its pure-Python encoder instead of the C one.
+    """
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        try:
+            return orjson.dumps(obj, default=_default, option=option)
+        except orjson.JSONEncodeError:
+            # Only reached for numbers from ijson that orjson.loads would have
+            # converted or refused
+            return orjson.dumps(_orjson_numbers(obj), option=option)
+    # ASCII-escaped output is still valid UTF-8 and skips the non-ASCII path
+    return json.dumps(obj, default=_default).encode('ascii')
+
+
+# Separators for the streamed article: indented to match orjson's output,
+# or compact to match a plain json.dumps on the stdlib fallback
+if orjson is not None:
+    _FIRST_FIELD, _FIELD_SEP, _FIRST_ITEM, _ITEM_SEP, _LAST_ITEM, _END = (
+        b'{\n  ', b',\n  ', b'\n    ', b',\n    ', b'\n  ]', b'\n}'
+    )
+else:
+    _FIRST_FIELD, _FIELD_SEP, _FIRST_ITEM, _ITEM_SEP, _LAST_ITEM, _END = (
+        b'{', b', ', b'', b', ', b']', b'}'
+    )
+
+
+def _indent(data, level):
+    """
+    Shift every line after the first of indented JSON bytes by `level` steps.
+
+    Compact output has no raw newlines, so it is returned unchanged.
+    """
+    return data.replace(b'\n', b'\n' + b'  ' * level)
+
+
+def _field_bytes(fields):
+    """Serialize top-level article fields as indented `"key": value` entries"""
+    return b''.join(
+        _FIELD_SEP + _dumps(key) + b': ' + _indent(_dumps(value), 1) for key, value in fields.items()
+    )
+
+
+def _write_all(fd, data):
+    """Write all of `data` to a raw file descriptor"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def read_article(path):
+    """
+    Return the article title and an iterator over its sections.
+
+    With ijson available the file is read in a single streaming pass and
+    the sections are built lazily, so only one section is held in memory
+    at a time. The iterator only finishes once the whole file has been
+    parsed and checked. If the title only follows the sections, they are
+    held in memory until it is found. Without ijson the file is mapped and parsed
+    whole, without first copying it into a bytes object.
+    """
+    if ijson is None:
+        with open(path, 'rb') as f:
+            # An empty file can't be mapped; let the decoder report it instead
+            if os.fstat(f.fileno()).st_size == 0:
+                article = _loads(f.read())
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                    article = _loads(view)
+        return article["title"], iter(article["sections"])
+
+    # One pass over the file: ijson's C parser produces the events and its
+    # builder assembles each section. Numbers stay as ijson's default
+    # int/Decimal, since use_float overflows outside the int64 range
+    events = ArticleEvents(_parse_events(path))
+    sections = ijson.items(events, 'sections.item')
+    first = next(sections, None)
+    if events.title is _MISSING:
+        # The title follows the sections (or is missing): hold them until
+        # the events have been read to the end
+        held = [] if first is None else [first, *sections]
+        return events.title, iter(held)
+    return events.title, chain(() if first is None else (first,), sections)
+
+
+def _parse_events(path):
+    with open(path, 'rb') as f:
+        yield from ijson.parse(f)
+
+
+class ArticleEvents:
+    """
+    Pass ijson parse events through, checking the article's top-level shape.
+
+    Only top-level events and the title's own events do any work here;
+    every other event goes straight on to ijson's builder. The document
+    must be an object with exactly one "title" and one "sections" array.
+    The final checks run once the events have been read to the end of the
+    file, so a truncated or malformed article fails before it is replaced.
+    """
+
+    def __init__(self, events):
+        self._events = events
+        self.title = _MISSING
+
+    def __iter__(self):
+        events = self._events
+        event = next(events)
+        if event[1] != 'start_map':
+            raise TypeError('article.json must contain a JSON object')
+        yield event
+
+        seen = set()
+        pending = title_builder = None
+        for event in events:
+            if not event[0]:
+                if pending == 'title':
+                    self.title = title_builder.value
+                pending = None
+                if event[1] == 'map_key' and event[2] in ('title', 'sections'):
+                    pending = event[2]
+                    if pending in seen:
+                        raise ValueError(f'Duplicate "{pending}" key in article.json')
+                    seen.add(pending)
+                    if pending == 'title':
+                        title_builder = ijson.ObjectBuilder()
+            elif pending is not None:
+                if pending == 'title':
+                    title_builder.event(event[1], event[2])
+                else:
+                    if event[1] != 'start_array':
+                        raise TypeError('"sections" in article.json must be an array')
+                    pending = None
+            yield event
+
+        if 'title' not in seen:
+            raise KeyError('title')
+        if 'sections' not in seen:
+            raise KeyError('sections')
+
+
+class StreamingJSONWriter:
+    """
+    Write the enhanced article incrementally.
+
+    Emits the title and the pre-serialized HEADER_BYTES, then one section
+    at a time. With orjson the layout matches a single indented dump of
+    the whole article; the stdlib fallback writes it compact instead, as
+    a plain json.dumps would. Each piece is built as one bytes buffer and
+    written straight to the file descriptor, bypassing the BufferedWriter
+    copy.
+    """
+
+    def __init__(self, fd, title):
+        self._fd = fd
+        self.count = 0
+        title_field = _FIRST_FIELD + b'"title": ' + _indent(_dumps(title), 1)
+        _write_all(fd, title_field + HEADER_BYTES + _FIELD_SEP + b'"sections": [')
+
+    def write_section(self, data):
+        """Write one section, already serialized with `_dumps`"""
+        _write_all(self._fd, (_ITEM_SEP if self.count else _FIRST_ITEM) + _indent(data, 2))
+        self.count += 1
+
+    def close(self):
+        _write_all(self._fd, (_LAST_ITEM if self.count else b']') + _END)
+
+
+# Metadata lists shared by reference into every enhanced section
+SHARED_LIST_KEYS = ("tags", "keyTakeaways", "references", "exercises")
+
+
+def _freeze_lists(meta):
+    """Store a metadata entry's shared lists as tuples"""
+    return {key: tuple(value) if key in SHARED_LIST_KEYS else value for key, value in meta.items()}
+
+
+@lru_cache(maxsize=1)
+def load_section_metadata():
+    """Load the per-section metadata mappings once, as a read-only mapping"""
+    metadata = _loads(METADATA_PATH.read_bytes())
+    return MappingProxyType({section_id: _freeze_lists(meta) for section_id, meta in metadata.items()})
 
-# Read original article
-with open('article.json', 'r') as f:
-    article = json.load(f)
 
 # Metadata mappings for each section
-SECTION_METADATA = {
-    "visual-abstract": {
-        "estimatedReadingTime": 5,
-        "tags": ["overview", "introduction", "conceptual"],
-        "type": "visual-abstract"
-    },
-    "executive-summaries": {
-        "estimatedReadingTime": 10,
-        "tags": ["summary", "overview", "accessible"]
-    },
-    "reading-guide": {
-        "estimatedReadingTime": 5,
-        "tags": ["navigation", "guide", "overview"]
-    },
-    "glossary": {
-        "estimatedReadingTime": 15,
-        "tags": ["reference", "definitions", "terminology"],
-        "type": "glossary"
-    },
-    "chapter-1": {
-        "chapterNumber": 1,
-        "partNumber": 1,
-        "estimatedReadingTime": 25,
-        "tags": ["foundations", "philosophy", "examples", "introduction"],
-        "keyTakeaways": [
-            "Persistence asks 'what prevents things from continuing' rather than 'why does order emerge'",
-            "Stable configurations naturally outlast unstable ones",
-            "The universe edits instability rather than constructs complexity",
-            "The persistence principle appears in everyday phenomena"
-        ]
-    },
-    "chapter-2": {
-        "chapterNumber": 2,
-        "partNumber": 1,
-        "estimatedReadingTime": 30,
-        "tags": ["physics", "quantum mechanics", "metaphor", "critical analysis"],
-        "keyTakeaways": [
-            "Real interference requires Hilbert space, superposition, and phase coherence",
-            "Most metaphorical uses of 'interference' lack mathematical rigor",
-            "Brain waves are legitimate waves; market 'interference' is just competition"
-        ],
-        "references": [{
-            "id": "feynman-2006",
-            "number": 1,
-            "text": "Feynman, R. P. (2006). QED: The Strange Theory of Light and Matter. Princeton University Press."
-        }]
-    },
-    "chapter-3": {
-        "chapterNumber": 3,
-        "partNumber": 2,
-        "estimatedReadingTime": 35,
-        "tags": ["theory", "axioms", "principles", "analogies"],
-        "keyTakeaways": [
-            "Conservation laws ensure substrate persistence",
-            "Differential persistence: stable things last longer",
-            "Persistence is a passive property, not an active force"
-        ]
-    },
-    "chapter-4": {
-        "chapterNumber": 4,
-        "partNumber": 2,
-        "estimatedReadingTime": 30,
-        "tags": ["worldview", "philosophy", "comparison", "paradigm shift"],
-        "keyTakeaways": [
-            "Construction view asks 'why does order emerge?'",
-            "Persistence view asks 'what prevents continuation?'",
-            "Similar to Copernican and Darwinian revolutions"
-        ]
-    },
-    "chapter-5": {
-        "chapterNumber": 5,
-        "partNumber": 3,
-        "estimatedReadingTime": 35,
-        "tags": ["AI", "deep learning", "neural networks", "machine learning"],
-        "keyTakeaways": [
-            "Loss landscapes have large connected basins (mode connectivity)",
-            "Training doesn't construct solutions, it finds persistent states",
-            "AI safety is about attractor engineering"
-        ],
-        "references": [
-            {
-                "id": "garipov-2018",
-                "number": 1,
-                "text": "Garipov, T., et al. (2018). Loss surfaces, mode connectivity, and fast ensembling of DNNs."
-            },
-            {
-                "id": "li-2018",
-                "number": 2,
-                "text": "Li, H., et al. (2018). Visualizing the Loss Landscape of Neural Nets."
-            }
-        ]
-    },
-    "chapter-6": {
-        "chapterNumber": 6,
-        "partNumber": 3,
-        "estimatedReadingTime": 25,
-        "tags": ["evolution", "biology", "LTEE", "natural selection"],
-        "keyTakeaways": [
-            "Evolution is persistence in action: stable forms survive",
-            "LTEE shows power-law fitness improvements",
-            "Life origin: What stops self-sustaining reactions from continuing?"
-        ],
-        "references": [{
-            "id": "lenski-2023",
-            "number": 1,
-            "text": "Lenski, R. E. (2023). The E. coli Long-Term Evolution Experiment."
-        }]
-    },
-    "chapter-7": {
-        "chapterNumber": 7,
-        "partNumber": 3,
-        "estimatedReadingTime": 25,
-        "tags": ["cosmology", "physics", "anthropic principle", "dark matter"],
-        "keyTakeaways": [
-            "Anthropic principle is survivor bias on cosmic scale",
-            "Fine-tuning problem dissolves: we observe persistent configurations",
-            "Simpler models (classical dark matter) likely more persistent"
-        ],
-        "references": [{
-            "id": "hui-2021",
-            "number": 1,
-            "text": "Hui, L. (2021). Wave Dark Matter. Annual Review of Astronomy and Astrophysics."
-        }]
-    },
-    "chapter-8": {
-        "chapterNumber": 8,
-        "partNumber": 4,
-        "estimatedReadingTime": 30,
-        "tags": ["critique", "physics envy", "pseudoscience", "methodology"],
-        "keyTakeaways": [
-            "Physics envy: inappropriate importation of physics concepts",
-            "Quantum mind fails: brain too warm and wet for quantum effects",
-            "Economic 'quantum' models lack predictive power"
-        ]
-    },
-    "chapter-9": {
-        "chapterNumber": 9,
-        "partNumber": 4,
-        "estimatedReadingTime": 40,
-        "tags": ["FAQ", "objections", "defense", "philosophy of science"],
-        "keyTakeaways": [
-            "Semantics matter: words guide research programs",
-            "Persistence unifies attractor dynamics, SOC, natural selection",
-            "Conservation laws may be more fundamental than Schrödinger equation"
-        ]
-    },
-    "chapter-10": {
-        "chapterNumber": 10,
-        "partNumber": 5,
-        "estimatedReadingTime": 25,
-        "tags": ["toolkit", "practical", "application", "methodology"],
-        "keyTakeaways": [
-            "Identify what persists, transformation operators, attractors",
-            "To change a state: make it less persistent or create deeper attractor",
-            "Avoid confusing persistence with desirability"
-        ],
-        "exercises": [{
-            "id": "persistence-worksheet",
-            "type": "worksheet",
-            "title": "Persistence Analysis Worksheet",
-            "difficulty": "orange",
-            "description": "Apply the persistence framework to analyze a system"
-        }]
-    },
-    "chapter-11": {
-        "chapterNumber": 11,
-        "partNumber": 5,
-        "estimatedReadingTime": 20,
-        "tags": ["resources", "bibliography", "further reading"],
-        "keyTakeaways": [
-            "Key resources: Gleick's Chaos, Kauffman's At Home in the Universe",
-            "Interactive tools: PhET simulations, 3Blue1Brown videos",
-            "Santa Fe Institute: leading center for complexity science"
-        ]
-    },
-    "appendices": {
-        "estimatedReadingTime": 30,
-        "tags": ["technical", "mathematics", "advanced"],
-        "type": "appendix"
-    },
-    "bibliography": {
-        "estimatedReadingTime": 20,
-        "tags": ["references", "citations", "resources"],
-        "type": "bibliography"
-    }
-}
+SECTION_METADATA = load_section_metadata()
+
+
+def _compile_rewriter(section_id, meta):
+    """
+    Generate a function rewriting one section, with its metadata inlined.
+
+    The function returns a single dict display that adds keys in the order
+    the original per-key assignments did; a repeated key keeps its first
+    position and its last value, just as reassigning it did. Scalars and
+    tuples of scalars become literals in the generated source; other
+    values are bound by name so they stay shared by reference.
+    """
+    namespace = {}
+
+    def field(key, value):
+        if isinstance(value, (str, int)) or (
+            isinstance(value, tuple) and all(isinstance(item, (str, int)) for item in value)
+        ):
+            return f', {key!r}: {value!r}'
+        name = f'_c{len(namespace)}'
+        namespace[name] = value
+        return f', {key!r}: {name}'
+
+    body = ''
+    if "chapterNumber" in meta:
+        body += field("type", "chapter") + field("chapterNumber", meta["chapterNumber"])
+    if "partNumber" in meta:
+        body += field("partNumber", meta["partNumber"])
+    if "type" in meta:
+        body += field("type", meta["type"])
+    # Merged over any metadata the section already carries
+    body += (
+        ', "metadata": {**section.get("metadata", {})'
+        + field("estimatedReadingTime", meta["estimatedReadingTime"])
+        + field("tags", meta["tags"])
+        + '}'
+    )
+    for key in ("keyTakeaways", "references", "exercises"):
+        if key in meta:
+            body += field(key, meta[key])
+
+    source = f'def rewrite(section):\n    return {{**section{body}}}\n'
+    exec(compile(source, f'<rewrite {section_id}>', 'exec'), namespace)
+    return namespace['rewrite']
+
+
+# Generated per-section rewriters, built once at import
+REWRITERS = {section_id: _compile_rewriter(section_id, meta) for section_id, meta in SECTION_METADATA.items()}
+
+
+def write_sections(sections, writer):
+    """Enhance each section and hand it to the writer"""
+    # Bind lookups to locals once, outside the loop
+    rewriter_get = REWRITERS.get
+    dumps = _dumps
+    write_section = writer.write_section
+
+    for section in sections:
+        rewrite = rewriter_get(section["id"])
+        # Sections with nothing to overlay pass through untouched
+        write_section(dumps(section if rewrite is None else rewrite(section)))
 
-# Enhanced article structure
-enhanced = {
-    "title": article["title"],
+
+# Fixed fields following the title in the enhanced article, serialized once
+HEADER_BYTES = _field_bytes({
     "version": "1.0",
     "metadata": {
         "authors": [{
@@ -225,54 +349,33 @@ enhanced = {
         "showEstimatedTime": True,
         "enableNavigation": True,
         "enableSearch": True
-    },
-    "sections": []
-}
-
-# Process each section
-for section in article["sections"]:
-    enhanced_section = dict(section)  # Copy original
-    section_id = section["id"]
-
-    # Get metadata for this section
-    if section_id in SECTION_METADATA:
-        meta = SECTION_METADATA[section_id]
-
-        # Add chapter number and type
-        if "chapterNumber" in meta:
-            enhanced_section["type"] = "chapter"
-            enhanced_section["chapterNumber"] = meta["chapterNumber"]
-        if "partNumber" in meta:
-            enhanced_section["partNumber"] = meta["partNumber"]
-        if "type" in meta:
-            enhanced_section["type"] = meta["type"]
-
-        # Add/enhance metadata
-        if "metadata" not in enhanced_section:
-            enhanced_section["metadata"] = {}
-
-        enhanced_section["metadata"]["estimatedReadingTime"] = meta["estimatedReadingTime"]
-        enhanced_section["metadata"]["tags"] = meta["tags"]
-
-        # Add key takeaways
-        if "keyTakeaways" in meta:
-            enhanced_section["keyTakeaways"] = meta["keyTakeaways"]
-
-        # Add references
-        if "references" in meta:
-            enhanced_section["references"] = meta["references"]
-
-        # Add exercises
-        if "exercises" in meta:
-            enhanced_section["exercises"] = meta["exercises"]
+    }
+})
 
-    enhanced["sections"].append(enhanced_section)
+title, sections = read_article(ARTICLE_PATH)
 
-# Write enhanced version
-with open('article.json', 'w') as f:
-    json.dump(enhanced, f, indent=2, ensure_ascii=False)
+# Process each section, writing to a temporary file that replaces
+# article.json only once complete and synced: the input is still being
+# read while the output is produced, and a crash must not leave a torn file
+# Write through a symlinked article.json rather than replacing the link
+article_path = os.path.realpath(ARTICLE_PATH)
+fd, tmp_path = tempfile.mkstemp(prefix='.article.', suffix='.tmp', dir=os.path.dirname(article_path))
+try:
+    try:
+        # Keep article.json's permissions, as truncating it in place did
+        os.fchmod(fd, stat.S_IMODE(os.stat(article_path).st_mode))
+        writer = StreamingJSONWriter(fd, title)
+        write_sections(sections, writer)
+        writer.close()
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, article_path)
+except BaseException:
+    os.unlink(tmp_path)
+    raise
 
 print("✓ Enhanced article.json created")
 print(f"✓ Added metadata, version, settings")
-print(f"✓ Enhanced {len(enhanced['sections'])} sections")
+print(f"✓ Enhanced {writer.count} sections")
 print(f"✓ Added reading times, tags, key takeaways, references")